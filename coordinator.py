@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+
+import sys
+import time
+import json
+import socket
+import argparse
+import threading
+import socketserver
+
+# Constants
+COORDINATOR_HOST = "127.0.0.1"
+COORDINATOR_PORT = 5050
+SHARED_RESOURCES = ("pump", "tank")  # Hardware shared between all controller nodes
+LEASE_DURATION = 180  # Seconds before an unreleased resource is reclaimed
+ACQUIRE_POLL_INTERVAL = 1  # Seconds between acquire attempts
+NODE_STALE_AFTER = 60  # Seconds without any request before a node is shown as stale
+
+
+class Coordinator:
+    """Aggregates node snapshots and arbitrates the shared tank and pump"""
+
+    def __init__(self, lease_duration=LEASE_DURATION):
+        self.nodes = {}  # {node_id: {'snapshot': dict, 'last_seen': float}}
+        self.owners = {}  # {resource: {'node': node_id, 'expires': float}}
+        self.lease_duration = lease_duration
+        self.lock = threading.Lock()
+
+    def update_snapshot(self, node_id, snapshot):
+        with self.lock:
+            self.nodes[node_id] = {'snapshot': snapshot, 'last_seen': time.time()}
+        return {'ok': True}
+
+    def touch(self, node_id):
+        """Any request proves the node is alive, e.g. while it waits for the tank"""
+        with self.lock:
+            node = self.nodes.setdefault(node_id, {'snapshot': {}, 'last_seen': 0})
+            node['last_seen'] = time.time()
+
+    def acquire(self, node_id, resource):
+        """Grant a resource lease if it is free, expired or already held by this node
+
+        Acquiring a resource the node already holds renews its lease.
+        """
+        if resource not in SHARED_RESOURCES:
+            return {'ok': False, 'error': f"Unknown resource '{resource}'"}
+
+        now = time.time()
+        with self.lock:
+            owner = self.owners.get(resource)
+            if owner is None or owner['node'] == node_id or owner['expires'] < now:
+                self.owners[resource] = {'node': node_id, 'expires': now + self.lease_duration}
+                return {'ok': True, 'granted': True}
+            return {'ok': True, 'granted': False, 'owner': owner['node']}
+
+    def release(self, node_id, resource):
+        with self.lock:
+            owner = self.owners.get(resource)
+            if owner is not None and owner['node'] == node_id:
+                del self.owners[resource]
+        return {'ok': True}
+
+    def status(self):
+        """Unified view of every node and the current resource owners"""
+        now = time.time()
+        with self.lock:
+            nodes = {
+                node_id: dict(info['snapshot'], age=now - info['last_seen'])
+                for node_id, info in self.nodes.items()
+            }
+            owners = {
+                resource: owner['node']
+                for resource, owner in self.owners.items()
+                if owner['expires'] >= now
+            }
+        return {'ok': True, 'nodes': nodes, 'owners': owners}
+
+    def handle(self, message):
+        """Dispatch a single decoded request"""
+        op = message.get('op')
+        node_id = message.get('node')
+
+        if op != 'status' and node_id is not None:
+            self.touch(node_id)
+
+        if op == 'snapshot':
+            return self.update_snapshot(node_id, message.get('data', {}))
+        elif op == 'acquire':
+            return self.acquire(node_id, message.get('resource'))
+        elif op == 'release':
+            return self.release(node_id, message.get('resource'))
+        elif op == 'status':
+            return self.status()
+        return {'ok': False, 'error': f"Unknown op '{op}'"}
+
+
+class _CoordinatorHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # One JSON request per line, one JSON reply per line
+        for line in self.rfile:
+            try:
+                reply = self.server.coordinator.handle(json.loads(line))
+            except Exception as e:
+                reply = {'ok': False, 'error': str(e)}
+            self.wfile.write((json.dumps(reply) + "\n").encode())
+
+
+class CoordinatorServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, coordinator, host=COORDINATOR_HOST, port=COORDINATOR_PORT):
+        self.coordinator = coordinator
+        super().__init__((host, port), _CoordinatorHandler)
+
+
+class CoordinatorClient:
+    """Connection from a SmartFarmSystem node to the coordinator"""
+
+    def __init__(self, node_id, host=COORDINATOR_HOST, port=COORDINATOR_PORT, timeout=5,
+                 poll_interval=ACQUIRE_POLL_INTERVAL):
+        self.node_id = node_id
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.sock = None
+        self.reader = None
+
+    def _connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.reader = self.sock.makefile('r')
+
+    def close(self):
+        if self.sock is not None:
+            self.reader.close()
+            self.sock.close()
+        self.sock = None
+        self.reader = None
+
+    def request(self, op, **fields):
+        """Send one request, reconnecting once if the connection was dropped"""
+        message = dict(fields, op=op, node=self.node_id)
+        payload = (json.dumps(message) + "\n").encode()
+        for attempt in range(2):
+            try:
+                if self.sock is None:
+                    self._connect()
+                self.sock.sendall(payload)
+                line = self.reader.readline()
+                if not line:
+                    raise ConnectionError("Coordinator closed the connection")
+                return json.loads(line)
+            except OSError:
+                self.close()
+                if attempt:
+                    raise
+
+    def send_snapshot(self, snapshot):
+        return self.request('snapshot', data=snapshot)
+
+    def acquire(self, resource, timeout=LEASE_DURATION):
+        """Block until the resource is granted or timeout expires"""
+        start_time = time.time()
+        while True:
+            reply = self.request('acquire', resource=resource)
+            if reply.get('granted'):
+                return True
+            if time.time() - start_time >= timeout:
+                return False
+            time.sleep(self.poll_interval)
+
+    def release(self, resource):
+        return self.request('release', resource=resource)
+
+    def status(self):
+        return self.request('status')
+
+
+def simulate_node(client, cycles, hold):
+    """Hardware-free node: take the tank each cycle, hold it, publish a snapshot"""
+    for cycle in range(cycles):
+        if not client.acquire('tank'):
+            print("tank timeout", flush=True)
+            continue
+        start = time.time()
+        time.sleep(hold)
+        end = time.time()
+        client.release('tank')
+        # Printed after release so the held intervals can be checked for overlap
+        print(f"held tank {start:.6f} {end:.6f}", flush=True)
+        client.send_snapshot({
+            'moisture': {'sim': 50.0 + cycle},
+            'fill_in_progress': False,
+            'last_watering_time': end
+        })
+
+
+def print_status(status):
+    """Display the unified status of all nodes"""
+    print("\n=== Farm Nodes ===")
+    owners = status.get('owners', {})
+    for resource in SHARED_RESOURCES:
+        print(f"{resource.capitalize()}: {owners.get(resource, 'free')}")
+
+    print("\n{:<12} {:<8} {:<8} {:<12} {:<10}".format(
+        "Node", "State", "Pump", "Group", "Moisture"))
+    print("-" * 52)
+    for node_id, snapshot in sorted(status.get('nodes', {}).items()):
+        state = 'STALE' if snapshot['age'] > NODE_STALE_AFTER else 'OK'
+        pump = 'ON' if snapshot.get('fill_in_progress') else 'OFF'
+        moisture = snapshot.get('moisture', {})
+        if not moisture:
+            print("{:<12} {:<8} {:<8} {:<12} {:<10}".format(node_id, state, pump, '-', '-'))
+        for group, value in sorted(moisture.items()):
+            print("{:<12} {:<8} {:<8} {:<12} {:<10.1f}%".format(node_id, state, pump, group, value))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Smart Farm multi-node coordinator")
+    parser.add_argument('command', choices=['serve', 'status', 'simulate'])
+    parser.add_argument('--host', default=COORDINATOR_HOST)
+    parser.add_argument('--port', type=int, default=COORDINATOR_PORT)
+    parser.add_argument('--node', default='sim', help="Node name for simulate")
+    parser.add_argument('--cycles', type=int, default=5, help="Cycles for simulate")
+    parser.add_argument('--hold', type=float, default=2.0, help="Seconds each simulated cycle holds the tank")
+    parser.add_argument('--poll', type=float, default=ACQUIRE_POLL_INTERVAL, help="Acquire retry interval")
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        server = CoordinatorServer(Coordinator(), args.host, args.port)
+        print(f"Coordinator listening on {args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nStopping coordinator...")
+        finally:
+            server.server_close()
+    elif args.command == 'simulate':
+        client = CoordinatorClient(args.node, args.host, args.port, poll_interval=args.poll)
+        try:
+            simulate_node(client, args.cycles, args.hold)
+        finally:
+            client.close()
+    else:
+        client = CoordinatorClient('status', args.host, args.port)
+        try:
+            print_status(client.status())
+        except OSError as e:
+            print(f"Could not reach coordinator: {e}")
+            return 1
+        finally:
+            client.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
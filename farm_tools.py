@@ -8,10 +8,21 @@ import RPi.GPIO as GPIO
 from smbus2 import i2c_msg
 from adc_8chan_12bit import Pi_hat_adc
 from i2c import Bus
+from i2c_trace import MARK_LOOP, MARK_CYCLE, MARK_STOP, MARK_GRANTED, MARK_DENIED
+from rollup import MOISTURE_SERIES, WATERING_SERIES, PUMP_SERIES, REFILL_SERIES
 
 # Constants
 ADC_DEFAULT_IIC_ADDR = 0x04
 REG_SET_ADDR = 0xC0
+COMMAND_CHANGE_ADDR = 0x55  # First byte of an address change write to REG_SET_ADDR
+MIN_ADC_ADDR = 0x08  # Lowest address the ADC firmware will accept
+ADDRESS_CHANGE_DELAY = 0.05  # Time for the ADC to write its new address to flash
+TCA9548A_ADDR = 0x70  # I2C mux used to isolate boards during commissioning
+ISOLATE_DELAY = 0.02  # Settle time after switching mux channel
+POWER_ON_DELAY = 0.5  # Time for a freshly powered ADC to boot and join the bus
+MUX_CHANNELS = range(8)
+GPIO_PINS = range(2, 28)  # Usable BCM pins on the 40-pin header
+VERIFY_RETRIES = 3
 Moisture_Channels = [0,2,4,6]  # Each ADC has 4 moisture sensor channels
 WATERING_DURATION = 15  # Default watering duration in seconds
 MONITOR_INTERVAL = 15  # 15 sec between cycles
@@ -51,17 +62,17 @@ class I2CDeviceManager:
             try:
                 self.bus.write_quick(address)
                 found_devices.append(address)
-            except:
+            except OSError:
                 pass
         return found_devices
 
     def verify_device_address(self, expected_addr):
         """Check if device is active at given address"""
         try:
-            temp_bus = smbus2.SMBus(self.bus.bus)
+            temp_bus = Bus(self.bus.bus)
             temp_bus.write_quick(expected_addr)
             return True
-        except:
+        except OSError:
             return False
 
     def register_device(self, device_type, location, group, default_addr=0x04):
@@ -71,12 +82,12 @@ class I2CDeviceManager:
 
     def _find_available_address(self, used_addresses, default_addr):
         """Find next available address"""
-        for addr in range(default_addr + 1, 0x77):
+        for addr in range(max(default_addr + 1, MIN_ADC_ADDR), 0x77):
             if addr not in used_addresses:
                 return addr
         return None
 
-    def _register_device_at_address(self, device_type, location, group, address):
+    def _register_device_at_address(self, device_type, location, group, address, save=True):
         """Helper to register a device at specific address"""
         self.devices[address] = {
             'type': device_type,
@@ -85,10 +96,198 @@ class I2CDeviceManager:
             'channels': Moisture_Channels,
             'last_seen': time.time()
         }
-        self.save_devices()
+        if save:
+            self.save_devices()
         print(f"Device successfully registered at {hex(address)}")
         return address
 
+    def _probe(self, address):
+        try:
+            self.bus.write_quick(address)
+            return True
+        except OSError:
+            return False
+
+    def _change_address(self, old_addr, new_addr):
+        """Move a board to a new address and confirm it answers there only"""
+        try:
+            self.bus.write_i2c_block_data(old_addr, REG_SET_ADDR, [COMMAND_CHANGE_ADDR, new_addr])
+        except OSError as e:
+            print(f"Address change {hex(old_addr)} -> {hex(new_addr)} failed: {e}")
+            return False
+
+        for _ in range(VERIFY_RETRIES):
+            time.sleep(ADDRESS_CHANGE_DELAY)
+            if self._probe(new_addr) and not self._probe(old_addr):
+                return True
+        return False
+
+    def enable_commissioned_boards(self):
+        """Re-enable the mux channels and power pins recorded by provision_batch"""
+        channels = {info['mux_channel'] for info in self.devices.values() if 'mux_channel' in info}
+        pins = {info['power_pin'] for info in self.devices.values() if 'power_pin' in info}
+
+        for pin in sorted(pins):
+            GPIO.setup(pin, GPIO.OUT)
+            # Active Low
+            GPIO.output(pin, GPIO.LOW)
+
+        if channels:
+            mask = 0
+            for channel in channels:
+                mask |= 1 << channel
+            try:
+                self.bus.write_byte(TCA9548A_ADDR, mask)
+            except OSError as e:
+                print(f"Error enabling mux channels: {e}")
+
+        if pins:
+            time.sleep(POWER_ON_DELAY)
+
+    def provision_batch(self, isolator, location, group, default_addr=ADC_DEFAULT_IIC_ADDR):
+        """Commission every factory-address ADC reachable through the isolator
+
+        Each slot is isolated in turn so only one board answers at
+        default_addr, which is then moved to a free address and verified.
+        The bus is scanned once up front and the registry is written once
+        at the end. Returns {slot: address or None}.
+        """
+        isolator.prepare()
+        used = set(self.scan_bus()) | set(self.devices)
+        used.discard(default_addr)
+        results = {}
+        slots = isolator.slots()
+
+        try:
+            for number, slot in enumerate(slots, 1):
+                isolator.isolate(slot)
+                time.sleep(isolator.settle_delay)
+
+                if not self._probe(default_addr):
+                    # A board that boots late must not join the next slot at the default address
+                    print(f"{isolator.describe(slot)}: no board at {hex(default_addr)}")
+                    isolator.skip(slot)
+                    results[slot] = None
+                    continue
+
+                new_addr = self._find_available_address(used, default_addr)
+                if new_addr is None:
+                    print("No free I2C addresses left - stopping")
+                    for remaining in slots[number - 1:]:
+                        isolator.exclude(remaining)
+                        results[remaining] = None
+                    break
+
+                if not self._change_address(default_addr, new_addr):
+                    # A board left at the default address would collide with the next slot
+                    print(f"{isolator.describe(slot)}: could not verify new address {hex(new_addr)}")
+                    isolator.exclude(slot)
+                    results[slot] = None
+                    continue
+
+                used.add(new_addr)
+                results[slot] = self._register_device_at_address(
+                    "ADC", f"{location} {number}", group, new_addr, save=False)
+                self.devices[new_addr][isolator.kind] = slot
+        finally:
+            try:
+                isolator.finish()
+            finally:
+                # Boards already moved must be recorded even if the mux stops answering
+                if any(addr is not None for addr in results.values()):
+                    self.save_devices()
+
+        return results
+
+
+class MuxIsolator:
+    """Isolates boards by enabling one TCA9548A channel at a time"""
+    kind = 'mux_channel'
+    settle_delay = ISOLATE_DELAY
+
+    def __init__(self, bus, channels, mux_addr=TCA9548A_ADDR):
+        for channel in channels:
+            if channel not in MUX_CHANNELS:
+                raise ValueError(f"Mux channel {channel} is not 0-7")
+        self.bus = bus
+        self.channels = list(channels)
+        self.mux_addr = mux_addr
+        self.excluded = set()
+
+    def slots(self):
+        return self.channels
+
+    def describe(self, slot):
+        return f"Mux channel {slot}"
+
+    def prepare(self):
+        self.finish()
+
+    def isolate(self, slot):
+        self.bus.write_byte(self.mux_addr, 1 << slot)
+
+    def skip(self, slot):
+        # The channel is switched off when the next slot is isolated
+        pass
+
+    def exclude(self, slot):
+        """Keep a channel whose board was not commissioned switched off"""
+        self.excluded.add(slot)
+        self.bus.write_byte(self.mux_addr, 0x00)
+
+    def finish(self):
+        # Leave every commissioned channel enabled so all boards stay reachable
+        mask = 0
+        for channel in self.channels:
+            if channel not in self.excluded:
+                mask |= 1 << channel
+        self.bus.write_byte(self.mux_addr, mask)
+
+
+class PowerGateIsolator:
+    """Isolates boards by powering them up one at a time from GPIO pins"""
+    kind = 'power_pin'
+    settle_delay = POWER_ON_DELAY
+
+    def __init__(self, pins):
+        for pin in pins:
+            if pin not in GPIO_PINS:
+                raise ValueError(f"GPIO pin {pin} is not a usable BCM pin (2-27)")
+        self.pins = list(pins)
+        self.excluded = set()
+
+    def slots(self):
+        return self.pins
+
+    def describe(self, slot):
+        return f"Power pin {slot}"
+
+    def prepare(self):
+        for pin in self.pins:
+            GPIO.setup(pin, GPIO.OUT)
+            # Active Low
+            GPIO.output(pin, GPIO.HIGH)
+
+    def isolate(self, slot):
+        # Earlier boards stay powered; they no longer answer at the default address
+        GPIO.output(slot, GPIO.LOW)
+
+    def skip(self, slot):
+        """Power down an unanswered slot until finish()"""
+        # Active Low
+        GPIO.output(slot, GPIO.HIGH)
+
+    def exclude(self, slot):
+        """Power down a board that was not commissioned and keep it off"""
+        self.excluded.add(slot)
+        # Active Low
+        GPIO.output(slot, GPIO.HIGH)
+
+    def finish(self):
+        for pin in self.pins:
+            if pin not in self.excluded:
+                GPIO.output(pin, GPIO.LOW)
+
 
 class DeviceGroupManager:
     def __init__(self, device_manager):
@@ -112,7 +311,7 @@ class DeviceGroupManager:
 
 
 class SmartFarmSystem:
-    def __init__(self):
+    def __init__(self, coordinator=None, rollup=None):
         # Initialize GPIO
         GPIO.setmode(GPIO.BCM)
         GPIO.setwarnings(True)
@@ -126,10 +325,18 @@ class SmartFarmSystem:
         # System state
         self.fill_in_progress = False
         self.last_watering_time = 0
+        self.last_moisture = {}  # {group_name: avg moisture from last monitor cycle}
         self.setup_complete = False
 
+        # Optional CoordinatorClient shared with other controller nodes
+        self.coordinator = coordinator
+
+        # Optional RollupEngine fed with readings as they arrive
+        self.rollup = rollup
+
         # Initialize subsystems
         self.device_manager = I2CDeviceManager()
+        self.device_manager.enable_commissioned_boards()
         self.group_manager = DeviceGroupManager(self.device_manager)
         self.adc = Pi_hat_adc()
 
@@ -256,6 +463,78 @@ class SmartFarmSystem:
         GPIO.output(self.water_sensor_pin, GPIO.HIGH)
         return value
 
+    def acquire_shared(self, resource):
+        """Acquire the shared pump/tank from the coordinator (always granted when standalone)"""
+        if self.coordinator is None:
+            return True
+        try:
+            granted = self.coordinator.acquire(resource)
+        except OSError as e:
+            print(f"Coordinator unreachable ({e}) - skipping use of shared {resource}")
+            granted = False
+        return self._mark_lease(resource, granted)
+
+    def renew_shared(self, resource):
+        """Extend a lease this node already holds; False if it has been lost"""
+        if self.coordinator is None:
+            return True
+        try:
+            granted = self.coordinator.acquire(resource, timeout=0)
+        except OSError as e:
+            print(f"Coordinator unreachable ({e}) - cannot renew shared {resource}")
+            granted = False
+        return self._mark_lease(resource, granted)
+
+    def _mark_lease(self, resource, granted):
+        # Recorded so replay can reproduce the coordinator's decision
+        Bus.mark(MARK_GRANTED if granted else MARK_DENIED, resource.encode())
+        return granted
+
+    def release_shared(self, resource):
+        if self.coordinator is None:
+            return
+        try:
+            self.coordinator.release(resource)
+        except OSError as e:
+            print(f"Error releasing shared {resource}: {e}")
+
+    def snapshot(self):
+        """State published to the coordinator (cached values only, no sensor reads)"""
+        return {
+            'moisture': dict(self.last_moisture),
+            'thresholds': dict(self.group_thresholds),
+            'fill_in_progress': self.fill_in_progress,
+            'last_watering_time': self.last_watering_time,
+            'devices': len(self.device_manager.devices)
+        }
+
+    def publish_snapshot(self):
+        if self.coordinator is None:
+            return
+        try:
+            self.coordinator.send_snapshot(self.snapshot())
+        except OSError as e:
+            print(f"Error publishing snapshot: {e}")
+
+    def record_reading(self, series, value):
+        if self.rollup is None:
+            return
+        try:
+            self.rollup.record(series, value)
+        except Exception as e:
+            print(f"Error recording {series}: {e}")
+
+    def save_rollup(self, force=False):
+        if self.rollup is None:
+            return
+        try:
+            if force:
+                self.rollup.save()
+            else:
+                self.rollup.maybe_save()
+        except Exception as e:
+            print(f"Error saving rollups: {e}")
+
     def check_water_level(self):
         """Check water level sensors"""
         return {
@@ -271,6 +550,16 @@ class SmartFarmSystem:
             return False
 
 
+        if not self.acquire_shared('pump'):
+            print("Shared pump busy - skipping pump cycle")
+            return False
+
+        try:
+            return self._run_pump(bottom_sensor)
+        finally:
+            self.release_shared('pump')
+
+    def _run_pump(self, bottom_sensor):
         start_time = time.time()
 
 
@@ -286,12 +575,16 @@ class SmartFarmSystem:
                 if top_wet:
                     GPIO.output(self.water_pump_pin, GPIO.HIGH)
                     self.fill_in_progress = False
+                    self.record_reading(PUMP_SERIES, time.time() - start_time)
+                    self.record_reading(REFILL_SERIES, 1)
                     print("Tank filled")
                     return True
                 time.sleep(1)
 
             # Timeout reached
             GPIO.output(self.water_pump_pin, GPIO.HIGH)
+            self.fill_in_progress = False
+            self.record_reading(PUMP_SERIES, time.time() - start_time)
             print("Pump timeout reached - stopping pump")
             return False
         return False
@@ -312,6 +605,8 @@ class SmartFarmSystem:
 
             if moisture_readings:
                 avg_moisture = sum(moisture_readings) / len(moisture_readings)
+                self.last_moisture[group_name] = avg_moisture
+                self.record_reading(MOISTURE_SERIES.format(group_name), avg_moisture)
                 threshold = self.group_thresholds[group_name]
                 groups_to_water[group_name] = avg_moisture < threshold
                 print(
@@ -323,8 +618,30 @@ class SmartFarmSystem:
         """Water groups that need it"""
         watering_occurred = False
 
+        if not any(groups_to_water.values()):
+            return watering_occurred
+
+        if not self.acquire_shared('tank'):
+            print("Shared tank busy - skipping watering cycle")
+            return watering_occurred
+
+        try:
+            watering_occurred = self._water_groups(groups_to_water)
+        finally:
+            self.release_shared('tank')
+
+        return watering_occurred
+
+    def _water_groups(self, groups_to_water):
+        watering_occurred = False
+
         for group_name, should_water in groups_to_water.items():
             if should_water:
+                # Renew per group so long watering runs don't outlast the lease
+                if not self.renew_shared('tank'):
+                    print("Lost shared tank lease - stopping watering")
+                    break
+
                 print(f"\n[Watering Cycle] Watering group '{group_name}' for {WATERING_DURATION} seconds")
                 GPIO.output(self.valve_pins[group_name], GPIO.LOW)
 
@@ -337,39 +654,60 @@ class SmartFarmSystem:
                     time.sleep(1)
 
                 GPIO.output(self.valve_pins[group_name], GPIO.HIGH)
+                self.record_reading(WATERING_SERIES.format(group_name), time.time() - start_time)
                 watering_occurred = True
                 self.last_watering_time = time.time()
 
         return watering_occurred
 
+    def outputs_off(self):
+        """Turn off the pump and close every valve"""
+        # Active Low
+        GPIO.output(self.water_pump_pin, GPIO.HIGH)
+        for pin in self.valve_pins.values():
+            GPIO.output(pin, GPIO.HIGH)
+        self.fill_in_progress = False
+
+    def run_cycle(self):
+        """Run the pump, monitoring and watering cycles once"""
+        print("\n=== Starting New Cycle ===")
+        Bus.mark(MARK_CYCLE)
+
+        # 1. Pump cycle
+        self.pump_cycle(self.read_water_sensor('bottom'))
+
+        # 2. Monitoring cycle
+        groups_to_water = self.monitor_cycle()
+
+        # 3. Watering cycle
+        watering_occurred = self.watering_cycle(groups_to_water)
+
+        # Share this node's state with the coordinator
+        self.publish_snapshot()
+
+        self.save_rollup()
+
+        return watering_occurred
+
     def main_loop(self):
         """Main control loop with 3 cycles"""
         if not self.setup_complete:
             print("Please complete setup first!")
             return
 
+        Bus.mark(MARK_LOOP)
         try:
             while True:
-                print("\n=== Starting New Cycle ===")
-
-                # 1. Pump cycle
-                self.pump_cycle(self.read_water_sensor('bottom'))
-
-                # 2. Monitoring cycle
-                groups_to_water = self.monitor_cycle()
-
-                # 3. Watering cycle
-                watering_occurred = self.watering_cycle(groups_to_water)
+                self.run_cycle()
 
                 print(f"\nCycle complete. Waiting {MONITOR_INTERVAL // 60} minutes...")
                 time.sleep(MONITOR_INTERVAL)
 
         except KeyboardInterrupt:
             print("\nStopping system...")
-            # Turn off all outputs
-            GPIO.output(self.water_pump_pin, GPIO.HIGH)
-            for pin in self.valve_pins.values():
-                GPIO.output(pin, GPIO.HIGH)
+            Bus.mark(MARK_STOP)
+            self.outputs_off()
+            self.save_rollup(force=True)
 
 
 class SmartFarmUI:
@@ -382,7 +720,8 @@ class SmartFarmUI:
         print("2. Add ADC Device")
         print("3. View System Status")
         print("4. Start Main Loop")
-        print("5. Exit")
+        print("5. Commission ADC Batch")
+        print("6. Exit")
 
     def run(self):
         while True:
@@ -401,6 +740,8 @@ class SmartFarmUI:
                 else:
                     self.farm.main_loop()
             elif choice == '5':
+                self.commission_adc_batch()
+            elif choice == '6':
                 self.farm.device_manager.save_devices()
                 GPIO.cleanup()
                 print("Goodbye!")
@@ -454,6 +795,57 @@ class SmartFarmUI:
         self.farm.device_manager.save_devices()
         print("Device saved successfully")
 
+    def commission_adc_batch(self):
+        """Assign addresses to many factory-default ADC boards at once"""
+        if not self.farm.setup_complete:
+            print("Please complete setup first!")
+            return
+
+        print("\nCommissioning ADC batch")
+        print("1. Isolate by mux channel")
+        print("2. Isolate by power gating")
+        method = input("Select isolation method: ")
+
+        try:
+            if method == '1':
+                channels = [int(c) for c in input("Enter mux channels (e.g. 0,1,2): ").split(',')]
+                isolator = MuxIsolator(self.farm.device_manager.bus, channels)
+            elif method == '2':
+                pins = [int(p) for p in input("Enter GPIO power pins (e.g. 5,6,13): ").split(',')]
+                in_use = set(self.farm.valve_pins.values()) | {self.farm.water_pump_pin, self.farm.water_sensor_pin}
+                if in_use & set(pins):
+                    raise ValueError(f"Pins already used by the farm: {sorted(in_use & set(pins))}")
+                isolator = PowerGateIsolator(pins)
+            else:
+                print("Invalid method")
+                return
+        except ValueError as e:
+            print(f"Invalid list: {e}")
+            return
+
+        location = input("Enter location prefix for these ADCs: ")
+
+        print("\nAvailable groups:")
+        groups = list(self.farm.valve_pins.keys())
+        for i, group in enumerate(groups, 1):
+            print(f"{i}. {group}")
+
+        try:
+            group_choice = int(input("Select group for these ADCs: ")) - 1
+            group_name = groups[group_choice]
+        except (ValueError, IndexError):
+            print("Invalid group selection")
+            return
+
+        try:
+            results = self.farm.device_manager.provision_batch(isolator, location, group_name)
+        except OSError as e:
+            print(f"Commissioning failed (is the mux connected?): {e}")
+            return
+
+        assigned = [addr for addr in results.values() if addr is not None]
+        print(f"\nCommissioned {len(assigned)} of {len(results)} slots: {', '.join(hex(a) for a in assigned)}")
+
     def view_system_status(self):
         """Display current system status"""
         if not self.farm.setup_complete:
@@ -2,15 +2,39 @@
 
 import smbus2 as smbus
 from smbus2 import i2c_msg
+from i2c_trace import TraceWriter, OPS
 class Bus:
    instance = None
    MRAA_I2C = 0
+   backend = None  # Replaces smbus.SMBus when set, e.g. with a ReplayBus
+   recorder = None  # TraceWriter shared by every Bus while recording
 
    def __init__(self, bus=1):
       if not self.instance:
-         self.instance = smbus.SMBus(bus)
+         self.instance = (Bus.backend or smbus.SMBus)(bus)
       self.bus = bus
       self.msg = i2c_msg
 
+   @classmethod
+   def start_recording(cls, path):
+      """Record every transaction on every Bus to a binary trace"""
+      cls.stop_recording()
+      cls.recorder = TraceWriter(path)
+
+   @classmethod
+   def stop_recording(cls):
+      if cls.recorder is not None:
+         cls.recorder.close()
+         cls.recorder = None
+
+   @classmethod
+   def mark(cls, name, payload=b""):
+      """Write a cycle boundary or lease marker while recording"""
+      if cls.recorder is not None:
+         cls.recorder.mark(name, payload)
+
    def __getattr__(self, name):
-      return getattr(self.instance, name)
\ No newline at end of file
+      attr = getattr(self.instance, name)
+      if Bus.recorder is not None and name in OPS:
+         return Bus.recorder.wrap(name, attr)
+      return attr
@@ -0,0 +1,442 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import time
+import struct
+import types
+import argparse
+import threading
+from collections import namedtuple
+
+# Trace file layout: header, then one fixed record header + payload per transaction
+TRACE_MAGIC = b"SFTR"
+TRACE_VERSION = 1
+RECORD = struct.Struct("<dBBhfBHB")  # timestamp, op, addr, register, latency, flags, errno, payload length
+FLAG_ERROR = 0x01
+NO_REGISTER = -1
+FLUSH_EVERY = 64  # Records buffered before forcing a write to disk
+REPLAY_MODULES = ('RPi', 'RPi.GPIO', 'farm_tools', 'adc_8chan_12bit')  # Restored after replay_session
+
+# Traced smbus operations: {name: (op code, takes register)}
+OPS = {
+    'write_quick': (1, False),
+    'read_byte': (2, False),
+    'write_byte': (3, False),
+    'read_byte_data': (4, True),
+    'write_byte_data': (5, True),
+    'read_word_data': (6, True),
+    'write_word_data': (7, True),
+    'read_i2c_block_data': (8, True),
+    'write_i2c_block_data': (9, True),
+}
+OP_NAMES = {code: name for name, (code, _) in OPS.items()}
+
+# Markers written by SmartFarmSystem so replay can find cycle boundaries
+MARK_LOOP = 'mark_loop'  # main_loop started
+MARK_CYCLE = 'mark_cycle'  # run_cycle started
+MARK_STOP = 'mark_stop'  # main_loop interrupted
+MARK_GRANTED = 'mark_lease_granted'  # Coordinator granted the resource named in the payload
+MARK_DENIED = 'mark_lease_denied'  # Coordinator refused it (or was unreachable)
+MARKERS = {MARK_LOOP: 0x80, MARK_CYCLE: 0x81, MARK_STOP: 0x82, MARK_GRANTED: 0x83, MARK_DENIED: 0x84}
+BOUNDARY_MARKERS = (MARK_LOOP, MARK_CYCLE, MARK_STOP)
+LEASE_MARKERS = (MARK_GRANTED, MARK_DENIED)
+OP_NAMES.update({code: name for name, code in MARKERS.items()})
+
+Transaction = namedtuple('Transaction', 'timestamp op addr register latency error payload')
+
+
+def _encode_payload(name, args, result):
+    """Bytes written by the host or returned by the device"""
+    if name in ('write_byte', 'read_byte', 'read_byte_data'):
+        value = args[0] if name == 'write_byte' else result
+        return bytes([value & 0xFF])
+    if name == 'write_byte_data':
+        return bytes([args[1] & 0xFF])
+    if name == 'read_word_data':
+        return struct.pack("<H", result)
+    if name == 'write_word_data':
+        return struct.pack("<H", args[1])
+    if name == 'read_i2c_block_data':
+        return bytes(result)
+    if name == 'write_i2c_block_data':
+        return bytes(args[1])
+    return b""
+
+
+def _decode_result(name, payload):
+    if name in ('read_byte', 'read_byte_data'):
+        return payload[0]
+    if name == 'read_word_data':
+        return struct.unpack("<H", payload)[0]
+    if name == 'read_i2c_block_data':
+        return list(payload)
+    return None
+
+
+class TraceWriter:
+    """Appends every traced bus transaction to a binary trace file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(TRACE_MAGIC + bytes([TRACE_VERSION]))
+        self.lock = threading.Lock()
+        self.pending = 0
+
+    def write(self, timestamp, name, addr, register, latency, errno, payload):
+        op = MARKERS[name] if name in MARKERS else OPS[name][0]
+        flags = FLAG_ERROR if errno is not None else 0
+        header = RECORD.pack(timestamp, op, addr, register, latency, flags, errno or 0, len(payload))
+        with self.lock:
+            self.file.write(header + payload)
+            self.pending += 1
+            if self.pending >= FLUSH_EVERY:
+                self.file.flush()
+                self.pending = 0
+
+    def mark(self, name, payload=b""):
+        self.write(time.time(), name, 0, NO_REGISTER, 0.0, None, payload)
+
+    def wrap(self, name, func):
+        """Return func instrumented to record each call"""
+        takes_register = OPS[name][1]
+
+        def traced(addr, *args, **kwargs):
+            register = args[0] if takes_register else NO_REGISTER
+            timestamp = time.time()
+            start = time.perf_counter()
+            try:
+                result = func(addr, *args, **kwargs)
+            except OSError as e:
+                payload = _encode_payload(name, args, None) if name.startswith('write') else b""
+                self.write(timestamp, name, addr, register, time.perf_counter() - start,
+                           e.errno if e.errno is not None else 0, payload)
+                raise
+            self.write(timestamp, name, addr, register, time.perf_counter() - start,
+                       None, _encode_payload(name, args, result))
+            return result
+
+        return traced
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def read_trace(path):
+    """Yield Transactions from a trace file"""
+    with open(path, 'rb') as f:
+        header = f.read(len(TRACE_MAGIC) + 1)
+        if header[:len(TRACE_MAGIC)] != TRACE_MAGIC:
+            raise ValueError(f"{path} is not an I2C trace")
+        if header[-1] != TRACE_VERSION:
+            raise ValueError(f"Unsupported trace version {header[-1]}")
+
+        while True:
+            raw = f.read(RECORD.size)
+            if len(raw) < RECORD.size:
+                # A truncated tail means the recorder was killed mid-write
+                return
+            timestamp, op, addr, register, latency, flags, errno, length = RECORD.unpack(raw)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            error = errno if flags & FLAG_ERROR else None
+            yield Transaction(timestamp, OP_NAMES[op], addr, register, latency, error, payload)
+
+
+class ReplayStop(BaseException):
+    """Ends a replay; a BaseException so the farm's `except Exception` clauses don't swallow it"""
+
+
+class ReplayExhausted(ReplayStop):
+    pass
+
+
+class ReplayDivergence(ReplayStop):
+    pass
+
+
+class ReplayInterrupted(ReplayStop):
+    """The recorded main_loop was stopped part way through this cycle"""
+
+
+class ReplayClock:
+    """Virtual time driven by the trace: sleeps return immediately"""
+
+    def __init__(self, start):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def advance_to(self, timestamp):
+        self.now = max(self.now, timestamp)
+
+
+class ReplayBus:
+    """smbus-compatible backend answering from a recorded trace, in order"""
+
+    def __init__(self, transactions, clock=None):
+        self.transactions = list(transactions)
+        self.position = 0
+        self.clock = clock
+
+    def __getattr__(self, name):
+        if name not in OPS:
+            raise AttributeError(name)
+        takes_register = OPS[name][1]
+
+        def replayed(addr, *args, **kwargs):
+            register = args[0] if takes_register else NO_REGISTER
+            return self._next(name, addr, register)
+
+        return replayed
+
+    def _find_marker(self, start):
+        for i in range(start, len(self.transactions)):
+            if self.transactions[i].op in BOUNDARY_MARKERS:
+                return i
+        return None
+
+    def start_cycle(self):
+        """Move to the start of the next recorded cycle
+
+        Traffic outside main_loop (UI menus, setup) and the tail of an
+        interrupted loop are skipped up to the next loop marker.
+        """
+        while True:
+            i = self._find_marker(self.position)
+            if i is None:
+                self.position = len(self.transactions)
+                raise ReplayExhausted(f"No more cycles after transaction {self.position}")
+
+            marker = self.transactions[i]
+            if marker.op == MARK_CYCLE:
+                if i != self.position:
+                    raise ReplayDivergence(
+                        f"Cycle ended at transaction {self.position} but the trace has "
+                        f"{i - self.position} more before the next cycle")
+                self.position = i + 1
+                if self.clock is not None:
+                    self.clock.advance_to(marker.timestamp)
+                return
+            # Loop start or stop: everything up to here happened outside main_loop
+            self.position = i + 1
+
+    def _next(self, name, addr, register):
+        if self.position >= len(self.transactions):
+            raise ReplayExhausted(f"Trace ended after {self.position} transactions")
+
+        record = self.transactions[self.position]
+        if record.op == MARK_STOP:
+            raise ReplayInterrupted(f"Recording stopped at transaction {self.position}")
+        if record.op in LEASE_MARKERS:
+            raise ReplayDivergence(
+                f"Transaction {self.position}: trace expects a coordinator lease request, "
+                f"got {name} {hex(addr)} reg {register}")
+        if record.op in MARKERS:
+            raise ReplayDivergence(
+                f"Transaction {self.position}: trace cycle ended, got {name} {hex(addr)} reg {register}")
+        if (record.op, record.addr, record.register) != (name, addr, register):
+            raise ReplayDivergence(
+                f"Transaction {self.position}: expected {record.op} {hex(record.addr)} reg {record.register}, "
+                f"got {name} {hex(addr)} reg {register}")
+        self.position += 1
+
+        if self.clock is not None:
+            self.clock.advance_to(record.timestamp + record.latency)
+        if record.error is not None:
+            raise OSError(record.error, os.strerror(record.error))
+        return _decode_result(name, record.payload)
+
+    def next_lease(self, resource):
+        """Consume the recorded coordinator decision for a lease request"""
+        if self.position >= len(self.transactions):
+            raise ReplayExhausted(f"Trace ended after {self.position} transactions")
+
+        record = self.transactions[self.position]
+        if record.op == MARK_STOP:
+            raise ReplayInterrupted(f"Recording stopped at transaction {self.position}")
+        if record.op not in LEASE_MARKERS or record.payload != resource.encode():
+            raise ReplayDivergence(
+                f"Transaction {self.position}: node requested the shared {resource}, "
+                f"but the trace has {record.op} {record.payload.decode(errors='replace')}")
+        self.position += 1
+
+        if self.clock is not None:
+            self.clock.advance_to(record.timestamp)
+        return record.op == MARK_GRANTED
+
+    def close(self):
+        pass
+
+
+class ReplayCoordinator:
+    """CoordinatorClient stand-in that answers lease requests from the trace"""
+
+    def __init__(self, replay_bus):
+        self.replay_bus = replay_bus
+
+    def acquire(self, resource, timeout=None):
+        return self.replay_bus.next_lease(resource)
+
+    def release(self, resource):
+        pass
+
+    def send_snapshot(self, snapshot):
+        pass
+
+    def close(self):
+        pass
+
+
+class ReplayGPIO:
+    """RPi.GPIO stand-in that logs output changes against the replay clock"""
+    BCM = 11
+    OUT = 0
+    IN = 1
+    HIGH = 1
+    LOW = 0
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.events = []  # [(time, pin, value)]
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, mode):
+        pass
+
+    def output(self, pin, value):
+        self.events.append((self.clock.time(), pin, value))
+
+    def cleanup(self):
+        pass
+
+
+def replay_session(path, max_cycles=None):
+    """Run SmartFarmSystem cycles against a recorded trace
+
+    Uses farm_config.json and i2c_devices.json from the current directory,
+    which must match the recording node. Traces recorded with a coordinator
+    replay its recorded lease decisions. Returns the ReplayBus and ReplayGPIO
+    so callers can inspect how far the replay got and what the outputs did.
+    """
+    from i2c import Bus
+
+    transactions = list(read_trace(path))
+    if not any(record.op == MARK_CYCLE for record in transactions):
+        raise ValueError(f"{path} contains no recorded cycles")
+
+    clock = ReplayClock(transactions[0].timestamp)
+    replay_bus = ReplayBus(transactions, clock)
+    gpio = ReplayGPIO(clock)
+    coordinator = None
+    if any(record.op in LEASE_MARKERS for record in transactions):
+        coordinator = ReplayCoordinator(replay_bus)
+
+    # Allow replay on machines without RPi.GPIO; anything imported against
+    # the stub is dropped again afterwards so later imports get the real modules
+    saved_modules = {name: sys.modules.get(name) for name in REPLAY_MODULES}
+    try:
+        import RPi.GPIO
+    except ImportError:
+        rpi = types.ModuleType('RPi')
+        rpi.GPIO = gpio
+        sys.modules['RPi'] = rpi
+        sys.modules['RPi.GPIO'] = gpio
+
+    # Installed before importing farm_tools, whose ADC module opens a Bus at import time
+    saved_backend = Bus.backend
+    Bus.backend = lambda bus: replay_bus
+    import farm_tools
+
+    saved = farm_tools.GPIO, farm_tools.time
+    farm_tools.GPIO, farm_tools.time = gpio, clock
+
+    cycles = 0
+    try:
+        farm = farm_tools.SmartFarmSystem(coordinator)
+        while max_cycles is None or cycles < max_cycles:
+            replay_bus.start_cycle()
+            try:
+                farm.run_cycle()
+            except ReplayInterrupted:
+                farm.outputs_off()
+                continue
+            clock.sleep(farm_tools.MONITOR_INTERVAL)
+            cycles += 1
+    except ReplayExhausted:
+        pass
+    finally:
+        farm_tools.GPIO, farm_tools.time = saved
+        Bus.backend = saved_backend
+        for name, module in saved_modules.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+
+    print(f"Replayed {replay_bus.position}/{len(transactions)} transactions over {cycles} complete cycles")
+    return replay_bus, gpio
+
+
+def print_stats(path):
+    """Per-device transaction counts, errors and latency from a trace"""
+    stats = {}  # {(addr, op): [count, errors, suspicious, total latency, max latency]}
+    for record in read_trace(path):
+        if record.op in MARKERS:
+            continue
+        entry = stats.setdefault((record.addr, record.op), [0, 0, 0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += record.error is not None
+        entry[2] += record.payload in (b"\xff\xff", b"\x7f\x7f") and record.op.startswith('read')
+        entry[3] += record.latency
+        entry[4] = max(entry[4], record.latency)
+
+    print("{:<6} {:<22} {:<8} {:<8} {:<8} {:<10} {:<10}".format(
+        "Addr", "Operation", "Count", "Errors", "Suspect", "Mean(ms)", "Max(ms)"))
+    print("-" * 76)
+    for (addr, op), (count, errors, suspicious, total, worst) in sorted(stats.items()):
+        print("{:<6} {:<22} {:<8} {:<8} {:<8} {:<10.2f} {:<10.2f}".format(
+            hex(addr), op, count, errors, suspicious, total / count * 1000, worst * 1000))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or replay Smart Farm I2C traces")
+    parser.add_argument('command', choices=['dump', 'stats', 'replay'])
+    parser.add_argument('trace')
+    parser.add_argument('--cycles', type=int, help="Stop replay after this many cycles")
+    args = parser.parse_args(argv)
+
+    if args.command == 'dump':
+        for record in read_trace(args.trace):
+            if record.op in MARKERS:
+                label = f"{record.op} {record.payload.decode(errors='replace')}".strip()
+                print(f"{record.timestamp:.6f} --- {label} ---")
+                continue
+            status = f"ERR {record.error}" if record.error is not None else "OK"
+            print(f"{record.timestamp:.6f} {record.op:<22} {hex(record.addr)} reg {record.register:<4} "
+                  f"{list(record.payload)} {record.latency * 1000:.2f}ms {status}")
+    elif args.command == 'stats':
+        print_stats(args.trace)
+    else:
+        try:
+            replay_session(args.trace, args.cycles)
+        except ReplayDivergence as e:
+            print(f"Replay diverged from trace: {e}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
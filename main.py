@@ -1,7 +1,11 @@
 #!/usr/bin/env python
 
 from farm_tools import SmartFarmSystem, SmartFarmUI
+from coordinator import CoordinatorClient, COORDINATOR_HOST, COORDINATOR_PORT
+from rollup import RollupEngine
+from i2c import Bus
 import RPi.GPIO as GPIO
+import argparse
 import logging
 
 
@@ -16,17 +20,46 @@ def configure_logging():
     )
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Smart Farm controller node")
+    parser.add_argument('--node-id', help="Join a coordinator under this node name")
+    parser.add_argument('--coordinator-host', default=COORDINATOR_HOST)
+    parser.add_argument('--coordinator-port', type=int, default=COORDINATOR_PORT)
+    parser.add_argument('--record', metavar='TRACE', help="Record all I2C transactions to a trace file")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
     configure_logging()
     logging.info("Starting Smart Farm System")
 
+    if args.record:
+        Bus.start_recording(args.record)
+        logging.info(f"Recording I2C transactions to {args.record}")
+
+    coordinator = None
+    if args.node_id:
+        coordinator = CoordinatorClient(args.node_id, args.coordinator_host, args.coordinator_port)
+        logging.info(f"Joining coordinator at {args.coordinator_host}:{args.coordinator_port} as '{args.node_id}'")
+
+    try:
+        rollup = RollupEngine()
+    except (ImportError, ValueError, OSError) as e:
+        # Analytics must never stop irrigation, e.g. with a corrupt rollup file
+        logging.warning(f"Historical rollups disabled: {e}")
+        rollup = None
+
     try:
-        farm = SmartFarmSystem()
+        farm = SmartFarmSystem(coordinator, rollup)
         ui = SmartFarmUI(farm)
         ui.run()
     except Exception as e:
         logging.error(f"Fatal error: {str(e)}", exc_info=True)
     finally:
+        if coordinator is not None:
+            coordinator.close()
+        Bus.stop_recording()
         GPIO.cleanup()
         logging.info("System shutdown complete")
 
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import time
+import json
+import bisect
+import argparse
+
+# NumPy is only needed by RollupEngine; the series names below are imported
+# by farm_tools, which must still load without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Constants
+ROLLUP_FILE = "farm_rollup.json"  # Pre-aggregated history
+RESOLUTIONS = {'minute': 60, 'hour': 3600, 'day': 86400}  # Bucket widths in seconds
+RETENTION = {'minute': 7 * 86400, 'hour': 180 * 86400, 'day': None}  # None keeps forever
+SAVE_INTERVAL = 300  # Minimum seconds between writes of the rollup file
+STATS = ('min', 'max', 'sum', 'count')
+
+# Series names written by SmartFarmSystem
+MOISTURE_SERIES = "moisture:{}"  # Avg group moisture (%) per monitor cycle
+WATERING_SERIES = "watering:{}"  # Seconds watered per watering event
+PUMP_SERIES = "pump_on"  # Seconds of pump runtime per pump cycle
+REFILL_SERIES = "tank_refill"  # One sample per completed tank fill
+
+
+def bucket_start(timestamp, width):
+    """Align a timestamp to the start of its local-time bucket"""
+    offset = time.localtime(timestamp).tm_gmtoff
+    return int(timestamp - (timestamp + offset) % width)
+
+
+def week_start(timestamp):
+    """Local midnight of the Monday starting the timestamp's week"""
+    day = bucket_start(timestamp, RESOLUTIONS['day'])
+    day_index = (day + time.localtime(day).tm_gmtoff) // RESOLUTIONS['day']
+    weekday = (day_index + 3) % 7  # 1970-01-01 was a Thursday
+    # Realign after stepping back in case the week crosses a DST change
+    return bucket_start(day - weekday * RESOLUTIONS['day'] + RESOLUTIONS['hour'] * 12, RESOLUTIONS['day'])
+
+
+class RollupEngine:
+    """Incrementally maintains min/max/sum/count buckets per series and resolution"""
+
+    def __init__(self, rollup_file=ROLLUP_FILE):
+        if np is None:
+            raise ImportError("RollupEngine requires numpy (pip install numpy)")
+        self.rollup_file = rollup_file
+        self.series = {}  # {series: {resolution: {'start': [...], 'min': [...], ...}}}
+        self.arrays = {}  # {(series, resolution): {'start': ndarray, ...}} query cache
+        self.dirty = False
+        self.last_save = 0
+        self.load()
+
+    def load(self):
+        """Load buckets from JSON file"""
+        if os.path.exists(self.rollup_file):
+            with open(self.rollup_file, 'r') as f:
+                self.series = json.load(f)
+        self.arrays = {}
+
+    def save(self):
+        """Prune expired buckets and write the rollup file"""
+        self.prune()
+        # Write then rename so a power cut never leaves a truncated file
+        temp_file = self.rollup_file + ".tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(self.series, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.rollup_file)
+        self.dirty = False
+        self.last_save = time.time()
+
+    def maybe_save(self):
+        if self.dirty and time.time() - self.last_save >= SAVE_INTERVAL:
+            self.save()
+
+    def prune(self, now=None):
+        now = time.time() if now is None else now
+        for resolutions in self.series.values():
+            for resolution, buckets in resolutions.items():
+                keep_for = RETENTION[resolution]
+                if keep_for is None:
+                    continue
+                cut = bisect.bisect_left(buckets['start'], now - keep_for)
+                if cut:
+                    for key in buckets:
+                        del buckets[key][:cut]
+        self.arrays = {}
+
+    def record(self, series, value, timestamp=None):
+        """Fold one reading into every resolution of a series"""
+        timestamp = time.time() if timestamp is None else timestamp
+        resolutions = self.series.setdefault(series, {})
+
+        for resolution, width in RESOLUTIONS.items():
+            buckets = resolutions.setdefault(resolution, {key: [] for key in ('start',) + STATS})
+            start = bucket_start(timestamp, width)
+            starts = buckets['start']
+
+            # Readings normally arrive in order so the last bucket is the common case
+            if starts and starts[-1] == start:
+                i = len(starts) - 1
+            else:
+                i = bisect.bisect_left(starts, start)
+                if i == len(starts) or starts[i] != start:
+                    starts.insert(i, start)
+                    buckets['min'].insert(i, value)
+                    buckets['max'].insert(i, value)
+                    buckets['sum'].insert(i, 0.0)
+                    buckets['count'].insert(i, 0)
+
+            buckets['min'][i] = min(buckets['min'][i], value)
+            buckets['max'][i] = max(buckets['max'][i], value)
+            buckets['sum'][i] += value
+            buckets['count'][i] += 1
+            self.arrays.pop((series, resolution), None)
+
+        self.dirty = True
+
+    def _arrays(self, series, resolution):
+        key = (series, resolution)
+        if key not in self.arrays:
+            buckets = self.series.get(series, {}).get(resolution)
+            if buckets is None:
+                buckets = {name: [] for name in ('start',) + STATS}
+            self.arrays[key] = {
+                'start': np.asarray(buckets['start'], dtype=np.int64),
+                'min': np.asarray(buckets['min'], dtype=np.float64),
+                'max': np.asarray(buckets['max'], dtype=np.float64),
+                'sum': np.asarray(buckets['sum'], dtype=np.float64),
+                'count': np.asarray(buckets['count'], dtype=np.int64)
+            }
+        return self.arrays[key]
+
+    def query(self, series, resolution='day', start=None, end=None):
+        """Return bucket arrays (start, min, max, mean, sum, count) in [start, end)
+
+        resolution may also be 'week', which is derived from day buckets
+        with weeks starting on Monday.
+        """
+        source = 'day' if resolution == 'week' else resolution
+        if source not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution '{resolution}'")
+
+        arrays = self._arrays(series, source)
+        lo = 0 if start is None else np.searchsorted(arrays['start'], start, 'left')
+        hi = len(arrays['start']) if end is None else np.searchsorted(arrays['start'], end, 'left')
+        result = {key: values[lo:hi] for key, values in arrays.items()}
+
+        if resolution == 'week':
+            result = self._weekly(result)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result['mean'] = result['sum'] / result['count']
+        return result
+
+    def _weekly(self, days):
+        if not len(days['start']):
+            return days
+        offsets = np.array([time.localtime(t).tm_gmtoff for t in days['start']], dtype=np.int64)
+        day_index = (days['start'] + offsets) // RESOLUTIONS['day']
+        week_index = (day_index + 3) // 7  # 1970-01-01 was a Thursday
+        firsts = np.flatnonzero(np.r_[True, week_index[1:] != week_index[:-1]])
+        return {
+            'start': np.array([week_start(t) for t in days['start'][firsts].tolist()], dtype=np.int64),
+            'min': np.minimum.reduceat(days['min'], firsts),
+            'max': np.maximum.reduceat(days['max'], firsts),
+            'sum': np.add.reduceat(days['sum'], firsts),
+            'count': np.add.reduceat(days['count'], firsts)
+        }
+
+    def summary(self, series, start=None, end=None, resolution='day'):
+        """Collapse a time range of a series into a single min/max/mean/sum/count"""
+        buckets = self.query(series, resolution, start, end)
+        count = int(buckets['count'].sum())
+        if not count:
+            return {'min': None, 'max': None, 'mean': None, 'sum': 0.0, 'count': 0}
+        total = float(buckets['sum'].sum())
+        return {
+            'min': float(buckets['min'].min()),
+            'max': float(buckets['max'].max()),
+            'mean': total / count,
+            'sum': total,
+            'count': count
+        }
+
+    def groups(self):
+        prefix = MOISTURE_SERIES.format('')
+        return sorted(name[len(prefix):] for name in self.series if name.startswith(prefix))
+
+
+def print_report(engine, period, start):
+    """Per-group moisture and watering plus pump/tank activity for each period"""
+    print(f"\n=== {period.capitalize()} Report ===")
+    for group in engine.groups():
+        moisture = engine.query(MOISTURE_SERIES.format(group), period, start)
+        watering = engine.query(WATERING_SERIES.format(group), period, start)
+        watered = dict(zip(watering['start'].tolist(), watering['count'].tolist()))
+
+        print(f"\nGroup '{group}':")
+        print("{:<12} {:<8} {:<8} {:<8} {:<8}".format("Period", "Min", "Max", "Mean", "Waterings"))
+        print("-" * 48)
+        for i, bucket in enumerate(moisture['start'].tolist()):
+            print("{:<12} {:<8.1f} {:<8.1f} {:<8.1f} {:<8}".format(
+                time.strftime('%Y-%m-%d', time.localtime(bucket)),
+                moisture['min'][i], moisture['max'][i], moisture['mean'][i],
+                watered.get(bucket, 0)))
+
+    pump = engine.query(PUMP_SERIES, period, start)
+    refills = engine.query(REFILL_SERIES, period, start)
+    pumped = dict(zip(pump['start'].tolist(), pump['sum'].tolist()))
+    refilled = dict(zip(refills['start'].tolist(), refills['count'].tolist()))
+
+    print("\nPump and Tank:")
+    print("{:<12} {:<14} {:<8}".format("Period", "Pump on (s)", "Refills"))
+    print("-" * 34)
+    for bucket in sorted(set(pumped) | set(refilled)):
+        print("{:<12} {:<14.0f} {:<8}".format(
+            time.strftime('%Y-%m-%d', time.localtime(bucket)),
+            pumped.get(bucket, 0.0), refilled.get(bucket, 0)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Smart Farm historical rollups")
+    parser.add_argument('period', choices=['day', 'week'])
+    parser.add_argument('--days', type=int, default=30, help="How far back to report")
+    parser.add_argument('--file', default=ROLLUP_FILE)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.file):
+        print(f"No rollup history found at {args.file}")
+        return 1
+
+    engine = RollupEngine(args.file)
+    start = bucket_start(time.time() - args.days * 86400, RESOLUTIONS['day'])
+    if args.period == 'week':
+        start = week_start(start)
+    print_report(engine, args.period, start)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
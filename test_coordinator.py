@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import threading
+import subprocess
+import pytest
+
+from coordinator import Coordinator, CoordinatorServer, CoordinatorClient
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def server():
+    server = CoordinatorServer(Coordinator(), port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_lease_is_exclusive_until_released():
+    coordinator = Coordinator()
+    assert coordinator.acquire('a', 'tank')['granted']
+    assert not coordinator.acquire('b', 'tank')['granted']
+    assert coordinator.acquire('b', 'pump')['granted']
+
+    coordinator.release('b', 'tank')  # Not the owner: no effect
+    assert not coordinator.acquire('b', 'tank')['granted']
+
+    coordinator.release('a', 'tank')
+    assert coordinator.acquire('b', 'tank')['granted']
+
+
+def test_reacquire_renews_and_expired_lease_is_reclaimed():
+    coordinator = Coordinator(lease_duration=0.2)
+    coordinator.acquire('a', 'tank')
+    time.sleep(0.15)
+    assert coordinator.acquire('a', 'tank')['granted']
+    time.sleep(0.1)
+    assert not coordinator.acquire('b', 'tank')['granted']
+    time.sleep(0.25)
+    assert coordinator.acquire('b', 'tank')['granted']
+
+
+def test_unknown_resource_and_op_are_rejected():
+    coordinator = Coordinator()
+    assert not coordinator.acquire('a', 'valve')['ok']
+    assert not coordinator.handle({'op': 'reboot', 'node': 'a'})['ok']
+
+
+def test_waiting_node_is_not_stale():
+    coordinator = Coordinator()
+    coordinator.acquire('a', 'tank')
+    coordinator.handle({'op': 'acquire', 'node': 'b', 'resource': 'tank'})
+
+    nodes = coordinator.status()['nodes']
+    assert nodes['b']['age'] < 1
+
+
+def test_status_over_socket(server):
+    port = server.server_address[1]
+    client = CoordinatorClient('a', port=port)
+    try:
+        client.send_snapshot({'moisture': {'beds': 42.0}})
+        assert client.acquire('pump', timeout=0)
+        status = client.status()
+    finally:
+        client.close()
+
+    assert status['owners'] == {'pump': 'a'}
+    assert status['nodes']['a']['moisture'] == {'beds': 42.0}
+
+
+def test_node_processes_share_tank_exclusively(server):
+    port = server.server_address[1]
+    nodes = ['n1', 'n2', 'n3']
+    procs = [
+        subprocess.Popen(
+            [sys.executable, os.path.join(HERE, 'coordinator.py'), 'simulate', '--port', str(port),
+             '--node', node, '--cycles', '3', '--hold', '0.05', '--poll', '0.01'],
+            stdout=subprocess.PIPE, text=True)
+        for node in nodes
+    ]
+    outputs = [proc.communicate(timeout=30)[0] for proc in procs]
+    assert all(proc.returncode == 0 for proc in procs)
+
+    intervals = []
+    for output in outputs:
+        lines = [line.split() for line in output.splitlines()]
+        assert len(lines) == 3 and all(line[:2] == ['held', 'tank'] for line in lines)
+        intervals += [(float(line[2]), float(line[3])) for line in lines]
+
+    intervals.sort()
+    for (_, end), (next_start, _) in zip(intervals, intervals[1:]):
+        assert end <= next_start
+
+    status = server.coordinator.status()
+    assert status['owners'] == {}
+    assert sorted(status['nodes']) == nodes
+    assert all(status['nodes'][node]['moisture'] == {'sim': 52.0} for node in nodes)
@@ -0,0 +1,202 @@
+import sys
+import errno
+import pytest
+
+from i2c_trace import (TraceWriter, ReplayBus, ReplayClock, ReplayCoordinator, ReplayExhausted,
+                       ReplayDivergence, ReplayInterrupted, read_trace, NO_REGISTER, MARKERS,
+                       MARK_LOOP, MARK_CYCLE, MARK_STOP, MARK_GRANTED, MARK_DENIED)
+
+
+class FakeSMBus:
+    """Answers reads from a fixed block and NACKs one address"""
+
+    def read_i2c_block_data(self, addr, reg, length):
+        return [0x34, 0x12][:length]
+
+    def read_byte_data(self, addr, reg):
+        return 0x7F
+
+    def read_word_data(self, addr, reg):
+        return 0xBEEF
+
+    def write_i2c_block_data(self, addr, reg, data):
+        pass
+
+    def write_quick(self, addr):
+        if addr == 0x05:
+            raise OSError(errno.EREMOTEIO, "Remote I/O error")
+
+
+def record(path, calls):
+    bus = FakeSMBus()
+    writer = TraceWriter(str(path))
+    for name, args in calls:
+        if name in MARKERS:
+            writer.mark(name, *args)
+            continue
+        try:
+            writer.wrap(name, getattr(bus, name))(*args)
+        except OSError:
+            pass
+    writer.close()
+    return list(read_trace(str(path)))
+
+
+def test_round_trip_keeps_payloads_and_errors(tmp_path):
+    records = record(tmp_path / "t.bin", [
+        ('read_i2c_block_data', (0x04, 0x30, 2)),
+        ('read_byte_data', (0x04, 0x01)),
+        ('read_word_data', (0x04, 0x02)),
+        ('write_i2c_block_data', (0x04, 0xC0, [0x55, 0x08])),
+        ('write_quick', (0x05,)),
+    ])
+
+    assert [r.op for r in records] == [
+        'read_i2c_block_data', 'read_byte_data', 'read_word_data', 'write_i2c_block_data', 'write_quick']
+    assert records[0].register == 0x30 and records[0].payload == b"\x34\x12"
+    assert records[1].payload == b"\x7f"
+    assert records[2].payload == b"\xef\xbe"
+    assert records[3].payload == b"\x55\x08"
+    assert records[4].register == NO_REGISTER
+    assert records[4].error == errno.EREMOTEIO
+    assert all(r.error is None for r in records[:4])
+    assert all(r.latency >= 0 for r in records)
+
+
+def test_truncated_tail_is_dropped(tmp_path):
+    path = tmp_path / "t.bin"
+    record(path, [('read_i2c_block_data', (0x04, 0x30, 2))] * 3)
+    data = path.read_bytes()
+    path.write_bytes(data[:-1])
+
+    assert len(list(read_trace(str(path)))) == 2
+
+
+def test_rejects_non_trace_file(tmp_path):
+    path = tmp_path / "t.bin"
+    path.write_bytes(b"nope")
+    with pytest.raises(ValueError):
+        list(read_trace(str(path)))
+
+
+def test_replay_returns_recorded_results_and_errors(tmp_path):
+    records = record(tmp_path / "t.bin", [
+        (MARK_CYCLE, ()),
+        ('read_i2c_block_data', (0x04, 0x30, 2)),
+        ('read_word_data', (0x04, 0x02)),
+        ('write_quick', (0x05,)),
+    ])
+    clock = ReplayClock(0)
+    bus = ReplayBus(records, clock)
+
+    bus.start_cycle()
+    assert bus.read_i2c_block_data(0x04, 0x30, 2) == [0x34, 0x12]
+    assert bus.read_word_data(0x04, 0x02) == 0xBEEF
+    with pytest.raises(OSError) as e:
+        bus.write_quick(0x05)
+    assert e.value.errno == errno.EREMOTEIO
+    assert clock.time() >= records[-1].timestamp
+
+    with pytest.raises(ReplayExhausted):
+        bus.read_byte_data(0x04, 0x01)
+
+
+def test_replay_divergence_on_mismatched_transaction(tmp_path):
+    records = record(tmp_path / "t.bin", [(MARK_CYCLE, ()), ('read_i2c_block_data', (0x04, 0x30, 2))])
+    bus = ReplayBus(records)
+    bus.start_cycle()
+
+    with pytest.raises(ReplayDivergence):
+        bus.read_i2c_block_data(0x04, 0x31, 2)
+
+
+def test_replay_divergence_when_cycle_runs_long_or_short(tmp_path):
+    records = record(tmp_path / "t.bin", [
+        (MARK_CYCLE, ()),
+        ('read_word_data', (0x04, 0x02)),
+        (MARK_CYCLE, ()),
+        ('read_word_data', (0x04, 0x02)),
+    ])
+    bus = ReplayBus(records)
+    bus.start_cycle()
+    bus.read_word_data(0x04, 0x02)
+    with pytest.raises(ReplayDivergence):
+        bus.read_word_data(0x04, 0x02)
+
+    bus = ReplayBus(records)
+    bus.start_cycle()
+    with pytest.raises(ReplayDivergence):
+        bus.start_cycle()
+
+
+def test_start_cycle_skips_traffic_outside_main_loop(tmp_path):
+    records = record(tmp_path / "t.bin", [
+        ('read_byte_data', (0x04, 0x01)),  # UI before the loop
+        (MARK_LOOP, ()),
+        (MARK_CYCLE, ()),
+        ('read_word_data', (0x04, 0x02)),
+        (MARK_STOP, ()),
+        ('read_byte_data', (0x04, 0x01)),  # UI between loops
+        (MARK_LOOP, ()),
+        (MARK_CYCLE, ()),
+        ('read_i2c_block_data', (0x04, 0x30, 2)),
+    ])
+    bus = ReplayBus(records)
+
+    bus.start_cycle()
+    assert bus.read_word_data(0x04, 0x02) == 0xBEEF
+    with pytest.raises(ReplayInterrupted):
+        bus.read_word_data(0x04, 0x02)
+
+    bus.start_cycle()
+    assert bus.read_i2c_block_data(0x04, 0x30, 2) == [0x34, 0x12]
+    with pytest.raises(ReplayExhausted):
+        bus.start_cycle()
+
+
+def test_replay_coordinator_returns_recorded_lease_decisions(tmp_path):
+    records = record(tmp_path / "t.bin", [
+        (MARK_CYCLE, ()),
+        (MARK_GRANTED, (b"tank",)),
+        ('read_word_data', (0x04, 0x02)),
+        (MARK_DENIED, (b"tank",)),
+        (MARK_CYCLE, ()),
+        (MARK_DENIED, (b"tank",)),
+    ])
+    bus = ReplayBus(records)
+    coordinator = ReplayCoordinator(bus)
+
+    bus.start_cycle()
+    assert coordinator.acquire('tank')
+    assert bus.read_word_data(0x04, 0x02) == 0xBEEF
+    assert not coordinator.acquire('tank', timeout=0)
+
+    bus.start_cycle()
+    with pytest.raises(ReplayDivergence):
+        coordinator.acquire('pump')
+
+
+def test_replay_divergence_when_lease_request_is_missing(tmp_path):
+    records = record(tmp_path / "t.bin", [
+        (MARK_CYCLE, ()),
+        (MARK_GRANTED, (b"tank",)),
+        ('read_word_data', (0x04, 0x02)),
+    ])
+    bus = ReplayBus(records)
+    bus.start_cycle()
+
+    with pytest.raises(ReplayDivergence):
+        bus.read_word_data(0x04, 0x02)
+
+
+def test_replay_session_restores_imported_modules(tmp_path, monkeypatch):
+    pytest.importorskip("smbus2")
+    from i2c_trace import replay_session, REPLAY_MODULES
+    path = tmp_path / "t.bin"
+    record(path, [(MARK_CYCLE, ())])
+    monkeypatch.chdir(tmp_path)
+    before = {name: sys.modules.get(name) for name in REPLAY_MODULES}
+
+    replay_session(str(path))
+
+    assert {name: sys.modules.get(name) for name in REPLAY_MODULES} == before
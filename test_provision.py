@@ -0,0 +1,226 @@
+import sys
+import types
+import importlib
+import pytest
+
+pytest.importorskip("smbus2")
+
+from i2c import Bus
+
+MUX = 0x70
+
+
+class FakeGPIO(types.ModuleType):
+    """Records pin levels instead of driving hardware"""
+    BCM = 11
+    OUT = 0
+    IN = 1
+    HIGH = 1
+    LOW = 0
+
+    def __init__(self):
+        super().__init__('RPi.GPIO')
+        self.levels = {}
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, mode):
+        self.levels.setdefault(pin, None)
+
+    def output(self, pin, value):
+        self.levels[pin] = value
+
+    def cleanup(self):
+        pass
+
+
+class FakeBus:
+    """TCA9548A plus ADC boards that answer when their channel or power pin is on
+
+    boards maps a slot (mux channel or power pin) to the board's address.
+    Boards in `broken` ignore address changes.
+    """
+
+    def __init__(self, gpio, boards, occupied=(), broken=(), mux_present=True, power_gated=False):
+        self.gpio = gpio
+        self.boards = dict(boards)
+        self.occupied = set(occupied)
+        self.broken = set(broken)
+        self.mux_present = mux_present
+        self.power_gated = power_gated
+        self.mask = 0
+
+    def _enabled(self, slot):
+        if self.power_gated:
+            return self.gpio.levels.get(slot) == FakeGPIO.LOW
+        return bool(self.mask >> slot & 1)
+
+    def _visible(self):
+        visible = set(self.occupied)
+        if self.mux_present:
+            visible.add(MUX)
+        visible.update(addr for slot, addr in self.boards.items() if self._enabled(slot))
+        return visible
+
+    def write_quick(self, addr):
+        if addr not in self._visible():
+            raise OSError(121, "Remote I/O error")
+
+    def write_byte(self, addr, value):
+        if addr != MUX or not self.mux_present:
+            raise OSError(121, "Remote I/O error")
+        self.mask = value
+
+    def write_i2c_block_data(self, addr, reg, data):
+        if addr not in self._visible():
+            raise OSError(121, "Remote I/O error")
+        for slot, board_addr in self.boards.items():
+            if board_addr == addr and self._enabled(slot) and slot not in self.broken:
+                self.boards[slot] = data[1]
+
+
+@pytest.fixture
+def farm(monkeypatch):
+    """Import farm_tools against a fake GPIO module, removing it again afterwards"""
+    gpio = FakeGPIO()
+    rpi = types.ModuleType('RPi')
+    rpi.GPIO = gpio
+    monkeypatch.setitem(sys.modules, 'RPi', rpi)
+    monkeypatch.setitem(sys.modules, 'RPi.GPIO', gpio)
+    for name in ('farm_tools', 'adc_8chan_12bit'):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+
+    holder = {}
+    monkeypatch.setattr(Bus, 'backend', lambda bus: holder['bus'])
+    holder['bus'] = FakeBus(gpio, {})
+    farm_tools = importlib.import_module('farm_tools')
+    monkeypatch.setattr(farm_tools, 'ISOLATE_DELAY', 0)
+    monkeypatch.setattr(farm_tools, 'ADDRESS_CHANGE_DELAY', 0)
+    monkeypatch.setattr(farm_tools.MuxIsolator, 'settle_delay', 0)
+    monkeypatch.setattr(farm_tools.PowerGateIsolator, 'settle_delay', 0)
+
+    yield types.SimpleNamespace(tools=farm_tools, gpio=gpio, holder=holder)
+
+    sys.modules.pop('farm_tools', None)
+    sys.modules.pop('adc_8chan_12bit', None)
+
+
+def make_manager(farm, tmp_path, bus, devices=()):
+    farm.holder['bus'] = bus
+    manager = farm.tools.I2CDeviceManager(str(tmp_path / "devices.json"))
+    manager.devices = {addr: {'type': 'ADC', 'group': 'beds'} for addr in devices}
+    saves = []
+    original = manager.save_devices
+    manager.save_devices = lambda: (saves.append(1), original())
+    return manager, saves
+
+
+def test_first_free_address_is_firmware_minimum(farm, tmp_path):
+    manager, _ = make_manager(farm, tmp_path, FakeBus(farm.gpio, {}))
+    assert manager._find_available_address(set(), 0x04) == 0x08
+    assert manager._find_available_address({0x08, 0x09}, 0x04) == 0x0A
+
+
+def test_mux_batch_skips_occupied_addresses_and_saves_once(farm, tmp_path):
+    bus = FakeBus(farm.gpio, {0: 0x04, 1: 0x04, 2: 0x04}, occupied={0x08, 0x0A})
+    manager, saves = make_manager(farm, tmp_path, bus, devices={0x09})
+
+    results = manager.provision_batch(farm.tools.MuxIsolator(bus, [0, 1, 2]), "Bed", "beds")
+
+    assert results == {0: 0x0B, 1: 0x0C, 2: 0x0D}
+    assert bus.boards == {0: 0x0B, 1: 0x0C, 2: 0x0D}
+    assert bus.mask == 0b111
+    assert manager.devices[0x0C]['mux_channel'] == 1
+    assert len(saves) == 1
+
+
+def test_failed_address_change_excludes_channel(farm, tmp_path):
+    bus = FakeBus(farm.gpio, {0: 0x04, 1: 0x04, 2: 0x04}, broken={1})
+    manager, saves = make_manager(farm, tmp_path, bus)
+
+    results = manager.provision_batch(farm.tools.MuxIsolator(bus, [0, 1, 2]), "Bed", "beds")
+
+    assert results == {0: 0x08, 1: None, 2: 0x09}
+    assert bus.boards == {0: 0x08, 1: 0x04, 2: 0x09}
+    assert bus.mask == 0b101
+    assert len(saves) == 1
+
+
+def test_running_out_of_addresses_marks_remaining_slots(farm, tmp_path):
+    bus = FakeBus(farm.gpio, {0: 0x04, 1: 0x04, 2: 0x04})
+    manager, saves = make_manager(farm, tmp_path, bus, devices=range(0x08, 0x76))
+
+    results = manager.provision_batch(farm.tools.MuxIsolator(bus, [0, 1, 2]), "Bed", "beds")
+
+    assert results == {0: 0x76, 1: None, 2: None}
+    assert bus.mask == 0b001
+    assert len(saves) == 1
+
+
+def test_empty_batch_does_not_write_registry(farm, tmp_path):
+    bus = FakeBus(farm.gpio, {})
+    manager, saves = make_manager(farm, tmp_path, bus)
+
+    results = manager.provision_batch(farm.tools.MuxIsolator(bus, [0, 1]), "Bed", "beds")
+
+    assert results == {0: None, 1: None}
+    assert saves == []
+
+
+def test_missing_mux_raises_oserror(farm, tmp_path):
+    bus = FakeBus(farm.gpio, {0: 0x04}, mux_present=False)
+    manager, _ = make_manager(farm, tmp_path, bus)
+
+    with pytest.raises(OSError):
+        manager.provision_batch(farm.tools.MuxIsolator(bus, [0]), "Bed", "beds")
+
+
+def test_isolators_reject_invalid_slots(farm):
+    with pytest.raises(ValueError):
+        farm.tools.MuxIsolator(None, [0, 9])
+    with pytest.raises(ValueError):
+        farm.tools.PowerGateIsolator([5, 40])
+
+
+def test_power_gating_powers_down_failed_and_empty_slots(farm, tmp_path):
+    # Pin 6 has no board, pin 13's board ignores the address change
+    bus = FakeBus(farm.gpio, {5: 0x04, 13: 0x04, 19: 0x04}, broken={13}, power_gated=True)
+    manager, saves = make_manager(farm, tmp_path, bus)
+    isolator = farm.tools.PowerGateIsolator([5, 6, 13, 19])
+
+    levels = []
+    isolate = isolator.isolate
+    isolator.isolate = lambda slot: (levels.append(dict(farm.gpio.levels)), isolate(slot))
+
+    results = manager.provision_batch(isolator, "Bed", "beds")
+
+    assert results == {5: 0x08, 6: None, 13: None, 19: 0x09}
+    # When pin 19 was powered, the empty and failed slots were already off
+    assert levels[3][6] == FakeGPIO.HIGH and levels[3][13] == FakeGPIO.HIGH
+    # finish() restores power to everything except the failed board
+    assert farm.gpio.levels[5] == FakeGPIO.LOW
+    assert farm.gpio.levels[6] == FakeGPIO.LOW
+    assert farm.gpio.levels[13] == FakeGPIO.HIGH
+    assert farm.gpio.levels[19] == FakeGPIO.LOW
+    assert len(saves) == 1
+
+
+def test_commissioned_boards_are_enabled_at_startup(farm, tmp_path, monkeypatch):
+    monkeypatch.setattr(farm.tools, 'POWER_ON_DELAY', 0)
+    bus = FakeBus(farm.gpio, {})
+    manager, _ = make_manager(farm, tmp_path, bus)
+    manager.devices = {
+        0x08: {'mux_channel': 1},
+        0x09: {'mux_channel': 3},
+        0x0A: {'power_pin': 21},
+        0x0B: {},
+    }
+
+    manager.enable_commissioned_boards()
+
+    assert bus.mask == 0b1010
+    assert farm.gpio.levels[21] == FakeGPIO.LOW
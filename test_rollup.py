@@ -0,0 +1,98 @@
+import time
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from rollup import RollupEngine, RESOLUTIONS, bucket_start, week_start
+
+DAY = RESOLUTIONS['day']
+# Local 09:00 on Monday 2025-10-20
+MONDAY_9AM = time.mktime((2025, 10, 20, 9, 0, 0, 0, 0, -1))
+MONDAY = time.mktime((2025, 10, 20, 0, 0, 0, 0, 0, -1))
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return RollupEngine(str(tmp_path / "rollup.json"))
+
+
+def test_record_out_of_order_keeps_buckets_sorted(engine):
+    engine.record('s', 5.0, MONDAY_9AM + 120)
+    engine.record('s', 1.0, MONDAY_9AM)
+    engine.record('s', 3.0, MONDAY_9AM + 130)
+
+    minutes = engine.query('s', 'minute')
+    assert minutes['start'].tolist() == [MONDAY_9AM, MONDAY_9AM + 120]
+    assert minutes['count'].tolist() == [1, 2]
+    assert minutes['min'].tolist() == [1.0, 3.0]
+    assert minutes['max'].tolist() == [1.0, 5.0]
+    assert minutes['mean'].tolist() == [1.0, 4.0]
+
+    hours = engine.query('s', 'hour')
+    assert hours['count'].tolist() == [3]
+    assert hours['sum'].tolist() == [9.0]
+
+
+def test_query_range_is_half_open(engine):
+    for d in range(5):
+        engine.record('s', d, MONDAY_9AM + d * DAY)
+
+    days = engine.query('s', 'day', MONDAY + DAY, MONDAY + 3 * DAY)
+    assert days['start'].tolist() == [bucket_start(MONDAY_9AM + d * DAY, DAY) for d in (1, 2)]
+    assert engine.summary('s', MONDAY + DAY, MONDAY + 3 * DAY)['sum'] == 3.0
+    assert engine.summary('s', MONDAY + 10 * DAY)['count'] == 0
+
+
+def test_query_sees_new_records_after_caching(engine):
+    engine.record('s', 1.0, MONDAY_9AM)
+    assert engine.summary('s')['count'] == 1
+    engine.record('s', 2.0, MONDAY_9AM + DAY)
+    assert engine.summary('s')['count'] == 2
+
+
+def test_prune_drops_expired_minutes_but_keeps_days(engine):
+    engine.record('s', 1.0, MONDAY_9AM)
+    engine.record('s', 2.0, MONDAY_9AM + 10 * DAY)
+
+    engine.prune(now=MONDAY_9AM + 10 * DAY)
+
+    assert engine.query('s', 'minute')['count'].tolist() == [1]
+    assert engine.query('s', 'hour')['count'].tolist() == [1, 1]
+    assert engine.query('s', 'day')['count'].tolist() == [1, 1]
+
+
+def test_week_start_is_monday_midnight():
+    for d in range(7):
+        assert week_start(MONDAY_9AM + d * DAY) == MONDAY
+    assert week_start(MONDAY_9AM + 7 * DAY) == week_start(MONDAY + 7 * DAY + 3600)
+
+
+def test_weeks_align_across_series(engine):
+    for d in range(7):
+        engine.record('moisture:beds', 40 + d, MONDAY_9AM + d * DAY)
+    engine.record('watering:beds', 15, MONDAY_9AM + 2 * DAY)
+    engine.record('watering:beds', 15, MONDAY_9AM + 3 * DAY)
+    engine.record('watering:beds', 15, MONDAY_9AM + 8 * DAY)
+
+    moisture = engine.query('moisture:beds', 'week')
+    watering = engine.query('watering:beds', 'week')
+
+    assert moisture['start'].tolist() == [MONDAY]
+    assert moisture['mean'].tolist() == [43.0]
+    assert watering['start'].tolist() == [MONDAY, week_start(MONDAY_9AM + 8 * DAY)]
+    assert watering['count'].tolist() == [2, 1]
+
+
+def test_save_and_load_round_trip(engine):
+    engine.record('s', 1.5, time.time())
+    engine.save()
+
+    loaded = RollupEngine(engine.rollup_file)
+    assert loaded.summary('s')['sum'] == 1.5
+
+
+def test_save_replaces_file_atomically(engine, tmp_path):
+    engine.record('s', 1.0, time.time())
+    engine.save()
+
+    assert [p.name for p in tmp_path.iterdir()] == ["rollup.json"]